@@ -19,14 +19,30 @@ import os
 import re
 import subprocess
 from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import IO, Any, Dict, List, cast
 
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 
 HERE = Path(__file__).parent
 DEFAULT_TEMPLATE = str(HERE / "templates" / "report.md.j2")
 
+# Conventional commit subject: type(scope): description
+_CONV_RX = re.compile(r"^(?P<type>\w+)(?:\((?P<scope>[^)]+)\))?:\s*(?P<desc>.+)$")
+
+# Leading bullet marker on squash-body lines
+_BULLET_RX = re.compile(r"^[*-]\s*")
+
+# Unscoped subjects of these types are classified without the regex
+_TYPES = frozenset(
+    {"feat", "fix", "docs", "style", "refactor", "perf", "test", "chore", "build", "ci"}
+)
+
+# Read size when streaming `git log` output
+_PIPE_CHUNK = 64 * 1024
+
 
 def _default_repo_url() -> str:
     """Build GitHub repository URL from environment variables."""
@@ -35,41 +51,54 @@ def _default_repo_url() -> str:
     return f"{server}/{repo}" if repo else server
 
 
-def get_commits_pr(branch: str) -> List[Dict[str, str]]:
-    """Retrieve commits for a PR branch compared to origin/main."""
-    base = subprocess.check_output(
-        ["git", "merge-base", branch, "origin/main"], text=True
-    ).strip()
-    raw = subprocess.check_output(
-        ["git", "log", f"{base}..HEAD", "--pretty=format:%h|%H|%s|%b---END---"],
-        text=True,
-    )
-
-    commits: List[Dict[str, str]] = []
-    for chunk in raw.split("---END---"):
-        chunk = chunk.strip()
-        if not chunk:
-            continue
-
-        parts = chunk.split("|", 3)
-        if len(parts) < 4:
-            continue
-
-        short, full, subject, body = parts
-        subject = subject.strip()
-
-        if subject.lower().startswith("wip:"):
-            continue
+def get_commits_pr(branch: str) -> Iterator[Dict[str, str]]:
+    """
+    Retrieve commits for a PR branch compared to origin/main.
 
-        commits.append(
-            {
-                "sha": short,
-                "sha_full": full,
-                "subject": subject,
-                "body": body.strip(),
-            }
-        )
-    return commits
+    ``origin/main..<branch>`` already excludes everything reachable from
+    origin/main, so no separate ``git merge-base`` lookup is needed.
+    Output is streamed from the pipe and commits are yielded as they are
+    parsed: records end with RS (0x1e) and fields are NUL-separated, so
+    subjects or bodies containing ``|`` can no longer break the split.
+    """
+    with subprocess.Popen(
+        ["git", "log", f"origin/main..{branch}", "--pretty=format:%h%x00%H%x00%s%x00%b%x1e"],
+        stdout=subprocess.PIPE,
+    ) as proc:
+        stdout = cast(IO[bytes], proc.stdout)
+        pending = b""
+        for chunk in iter(lambda: stdout.read(_PIPE_CHUNK), b""):
+            *records, pending = (pending + chunk).split(b"\x1e")
+            for record in records:
+                commit = _parse_pr_record(record)
+                if commit is not None:
+                    yield commit
+        commit = _parse_pr_record(pending)
+        if commit is not None:
+            yield commit
+
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, proc.args)
+
+
+def _parse_pr_record(record: bytes) -> Dict[str, str] | None:
+    """Parse one ``git log`` record; return None for empty, malformed or WIP commits."""
+    parts = record.decode("utf-8", errors="replace").strip().split("\x00", 3)
+    if len(parts) < 4:
+        return None
+
+    short, full, subject, body = parts
+    subject = subject.strip()
+
+    if subject.lower().startswith("wip:"):
+        return None
+
+    return {
+        "sha": short,
+        "sha_full": full,
+        "subject": subject,
+        "body": body.strip(),
+    }
 
 
 def get_commit_squash() -> Dict[str, Any]:
@@ -84,20 +113,17 @@ def get_commit_squash() -> Dict[str, Any]:
     ).strip()
     short, full, subject, body = raw.split("|", 3)
 
-    commits: List[Dict[str, str]] = []
-    for line in (line.strip() for line in body.splitlines()):
-        if not line or line.lower().startswith("wip:"):
-            continue
-
+    commits: List[Dict[str, str]] = [
         # Normalize bullet points in squash body
-        cleaned = re.sub(r"^[*-]\s*", "", line)
-
-        commits.append({"subject": cleaned, "body": ""})
+        {"subject": _BULLET_RX.sub("", line), "body": ""}
+        for line in (line.strip() for line in body.splitlines())
+        if line and not line.lower().startswith("wip:")
+    ]
 
     return {"sha": short, "sha_full": full, "subject": subject, "commits": commits}
 
 
-def group_commits(commits: List[Dict[str, str]]) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+def group_commits(commits: Iterable[Dict[str, str]]) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
     """
     Group commits by type and scope based on conventional commit format.
 
@@ -105,14 +131,18 @@ def group_commits(commits: List[Dict[str, str]]) -> Dict[str, Dict[str, List[Dic
         feat(api): add new endpoint
     """
     grouped: Dict[str, Dict[str, List[Dict[str, Any]]]] = defaultdict(lambda: defaultdict(list))
-    pattern = re.compile(r"^(?P<type>\w+)(\((?P<scope>[^)]+)\))?:\s*(?P<desc>.+)$")
 
     for commit in commits:
         subject = commit["subject"]
         body = commit.get("body", "")
 
-        match = pattern.match(subject)
-        if match:
+        head, _, rest = subject.partition(":")
+        if rest and head in _TYPES:
+            # Fast path for the common "type: description" form
+            commit_type = head
+            scope = "(no scope)"
+            desc = rest.strip()
+        elif match := _CONV_RX.match(subject):
             commit_type = match.group("type")
             scope = match.group("scope") or "(no scope)"
             desc = match.group("desc").strip()
@@ -133,6 +163,29 @@ def group_commits(commits: List[Dict[str, str]]) -> Dict[str, Dict[str, List[Dic
     return grouped
 
 
+@lru_cache(maxsize=8)
+def _get_env(template_dir: str) -> Environment:
+    """Build the Jinja2 environment for a template directory (once per process)."""
+    cache_dir = os.environ.get("JINJA_BYTECODE_CACHE")
+    runner_temp = os.environ.get("RUNNER_TEMP")
+    if not cache_dir and runner_temp:
+        cache_dir = str(Path(runner_temp) / "jinja-bcc")
+    if cache_dir:
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    else:
+        bytecode_cache = FileSystemBytecodeCache()
+    return Environment(
+        loader=FileSystemLoader(template_dir),
+        autoescape=False,
+        trim_blocks=True,
+        lstrip_blocks=True,
+        bytecode_cache=bytecode_cache,
+        auto_reload=False,
+        cache_size=-1,
+    )
+
+
 def render(
     template_path: str,
     version: str,
@@ -143,13 +196,8 @@ def render(
     pr_number: int | None
 ) -> str:
     """Render the changelog using Jinja2 template."""
-    env = Environment(
-        loader=FileSystemLoader(Path(template_path).parent),
-        autoescape=False,
-        trim_blocks=True,
-        lstrip_blocks=True,
-    )
-    template = env.get_template(Path(template_path).name)
+    path = Path(template_path)
+    template = _get_env(str(path.parent)).get_template(path.name)
     return template.render(
         version=version,
         commits=commits,
@@ -159,6 +207,25 @@ def render(
         pr_number=pr_number
     )
 
+
+def prepend_changelog(changelog: Path, entry: bytes) -> None:
+    """
+    Prepend a rendered entry to the changelog file.
+
+    The pieces are written one after another to avoid building the
+    concatenated document in memory; the result ends with a single newline.
+    """
+    previous = changelog.read_bytes().rstrip() if changelog.exists() else b""
+    with changelog.open("wb") as fh:
+        if previous:
+            fh.write(entry)
+            fh.write(b"\n\n")
+            fh.write(previous)
+        else:
+            fh.write(entry.rstrip())
+        fh.write(b"\n")
+
+
 def main() -> None:
     """Main entry point for the CLI."""
     parser = argparse.ArgumentParser(description="Generate changelog from conventional commits")
@@ -197,11 +264,12 @@ def main() -> None:
           is_unreleased=is_unreleased,
           pr_number=args.pr_number
         )
-        changelog = Path("CHANGELOG.md")
-        previous = changelog.read_text(encoding="utf-8") if changelog.exists() else ""
-        changelog.write_text((md + "\n\n" + previous).rstrip() + "\n", encoding="utf-8")
 
-    Path(args.output).write_text(md, encoding="utf-8")
+    md_bytes = md.encode("utf-8")
+    if args.mode == "release":
+        prepend_changelog(Path("CHANGELOG.md"), md_bytes)
+
+    Path(args.output).write_bytes(md_bytes)
     print(md)
 
 
@@ -4,6 +4,7 @@ import argparse
 import re
 import subprocess
 import sys
+from functools import cache
 from pathlib import Path
 from typing import TypedDict, Any
 
@@ -36,11 +37,17 @@ def load_config(path: str) -> dict[str, Any]:
     return tomllib.loads(file_path.read_text(encoding="utf-8"))
 
 
+@cache
+def _compile(pattern: str) -> re.Pattern[str]:
+    """Compile a branch pattern once; config patterns are static for a run."""
+    return re.compile(pattern)
+
+
 def matches(branch: str, patterns: list[str] | None) -> bool:
     """Check if the branch name matches any of the given regex patterns."""
     if not patterns:
         return False
-    return any(re.fullmatch(pattern, branch) for pattern in patterns)
+    return any(_compile(pattern).fullmatch(branch) for pattern in patterns)
 
 
 def bump(branch: str, cfg: SemanticBranchConfig, current: str) -> str:
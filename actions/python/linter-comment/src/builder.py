@@ -9,12 +9,18 @@ Generate Ruff + MyPy markdown report for GitHub Actions.
 from __future__ import annotations
 
 import argparse
-import json
+import os
 import pathlib
 import sys
-from jinja2 import Environment, FileSystemLoader
+from functools import lru_cache
+from typing import TYPE_CHECKING
 import xml.etree.ElementTree as ET
 
+import orjson
+
+if TYPE_CHECKING:
+    from jinja2 import Environment
+
 
 # ---------------------------
 # Parsing
@@ -25,11 +31,11 @@ def load_ruff(path: str) -> list[dict]:
     p = pathlib.Path(path) if path else None
     if not p or not p.exists():
         return []
-    text = p.read_text(encoding="utf-8").strip()
-    if not text:
+    raw = p.read_bytes().strip()
+    if not raw:
         return []
     try:
-        return json.loads(text)
+        return orjson.loads(raw)
     except Exception:
         # If Ruff didn't output valid JSON, return empty rather than crash
         return []
@@ -53,6 +59,41 @@ def load_mypy_junit(path: str) -> list[str]:
     return issues
 
 
+def ruff_has_issues(path: str) -> bool:
+    """Cheap --check-exit probe: peek at the start of Ruff's JSON output.
+
+    Ruff writes ``[]`` when clean, so an empty file or one starting with an
+    empty array is answered from the first bytes (load_ruff() would return a
+    falsy value for both). Anything else falls back to load_ruff(), so the
+    verdict always matches the report.
+    """
+    p = pathlib.Path(path) if path else None
+    if not p or not p.exists():
+        return False
+    with p.open("rb") as f:
+        head = f.read(4096).lstrip()
+    if not head or (head.startswith(b"[") and head[1:].lstrip()[:1] == b"]"):
+        return False
+    return bool(load_ruff(path))
+
+
+def mypy_has_issues(path: str) -> bool:
+    """Cheap --check-exit probe: read the failure counter on MyPy's root <testsuite>.
+
+    Only the root start tag is parsed. Like load_mypy_junit(), only failures count;
+    without the counter fall back to load_mypy_junit().
+    """
+    p = pathlib.Path(path) if path else None
+    if not p or not p.exists():
+        return False
+    with p.open("rb") as f:
+        for _, root in ET.iterparse(f, events=("start",)):
+            if root.tag == "testsuite" and "failures" in root.attrib:
+                return int(root.get("failures") or 0) > 0
+            break
+    return bool(load_mypy_junit(path))
+
+
 # ---------------------------
 # Status message
 # ---------------------------
@@ -73,16 +114,35 @@ def build_status_message(ruff_count: int, mypy_count: int, fail_on: str) -> str:
 # Rendering
 # ---------------------------
 
-def render(ruff: list[dict], mypy: list[str], template: str, output: str, status_msg: str) -> None:
-    """Render report using Jinja2 template and write to output file."""
-    tmpl_path = pathlib.Path(template)
-    env = Environment(
-        loader=FileSystemLoader(str(tmpl_path.parent)),
+@lru_cache(maxsize=8)
+def _get_env(template_dir: str) -> Environment:
+    """Build the Jinja2 environment for a template directory (once per process)."""
+    from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+    cache_dir = os.environ.get("JINJA_BYTECODE_CACHE")
+    runner_temp = os.environ.get("RUNNER_TEMP")
+    if not cache_dir and runner_temp:
+        cache_dir = str(pathlib.Path(runner_temp) / "jinja-bcc")
+    if cache_dir:
+        pathlib.Path(cache_dir).mkdir(parents=True, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    else:
+        bytecode_cache = FileSystemBytecodeCache()
+    return Environment(
+        loader=FileSystemLoader(template_dir),
         autoescape=False,
         trim_blocks=True,
         lstrip_blocks=True,
+        bytecode_cache=bytecode_cache,
+        auto_reload=False,
+        cache_size=-1,
     )
-    t = env.get_template(tmpl_path.name)
+
+
+def render(ruff: list[dict], mypy: list[str], template: str, output: str, status_msg: str) -> None:
+    """Render report using Jinja2 template and write to output file."""
+    tmpl_path = pathlib.Path(template)
+    t = _get_env(str(tmpl_path.parent)).get_template(tmpl_path.name)
     markdown = t.render(
         ruff=ruff,
         mypy=mypy,
@@ -101,9 +161,9 @@ def write_outputs(outputs_path: str | None, ruff: list[dict], mypy: list[str]) -
     """Write GitHub Action outputs."""
     if not outputs_path:
         return
-    with open(outputs_path, "a", encoding="utf-8") as f:
-        f.write(f"ruff_issues={len(ruff)}\n")
-        f.write(f"mypy_issues={len(mypy)}\n")
+    payload = f"ruff_issues={len(ruff)}\nmypy_issues={len(mypy)}\n".encode()
+    with open(outputs_path, "ab") as f:
+        f.write(payload)
 
 
 # ---------------------------
@@ -121,18 +181,18 @@ def cli() -> None:
     parser.add_argument("--check-exit", action="store_true", help="Only evaluate fail/pass and exit")
     args = parser.parse_args()
 
-    ruff_issues = load_ruff(args.ruff)
-    mypy_issues = load_mypy_junit(args.mypy)
-
     if args.check_exit:
-        # Evaluation-only mode: no rendering required.
-        if args.fail_on == "any" and (ruff_issues or mypy_issues):
+        # Evaluation-only mode: no rendering required, and reports are only
+        # probed when they can change the outcome (MyPy is skipped if Ruff fails).
+        if args.fail_on == "any" and (ruff_has_issues(args.ruff) or mypy_has_issues(args.mypy)):
             sys.exit(1)
         sys.exit(0)
 
     if not args.template:
         parser.error("--template is required unless --check-exit is set")
 
+    ruff_issues = load_ruff(args.ruff)
+    mypy_issues = load_mypy_junit(args.mypy)
     status_msg = build_status_message(len(ruff_issues), len(mypy_issues), args.fail_on)
     render(ruff_issues, mypy_issues, args.template, args.output, status_msg)
     write_outputs(args.outputs, ruff_issues, mypy_issues)
@@ -12,14 +12,42 @@ Genera el comentario de pytest en Markdown para GitHub Actions.
 from __future__ import annotations
 
 import argparse
-import json
+import heapq
 import os
 import sys
-import xml.etree.ElementTree as ET
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
-from typing import Any
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any
 
-from jinja2 import Environment, FileSystemLoader
+import ijson
+
+if TYPE_CHECKING:
+    from jinja2 import Environment
+
+try:
+    from lxml import etree as ET  # noqa: N812
+except ImportError:  # lxml es opcional: se recurre al parser de la stdlib
+    import xml.etree.ElementTree as ET
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), "templates", "report.md.j2")
+
+# Tamaño de coverage.json a partir del cual se parsea en un proceso aparte:
+# por debajo, arrancar el worker cuesta más que lo que se solapa
+PARALLEL_COVERAGE_BYTES = 8 * 1024 * 1024
+
+# Máximo de ficheros bajo el umbral listados en el comentario
+MAX_UNDER_FILES = 20
+
+# Hijos de <testcase> que cuentan como fallo
+_FAILURE_TAGS = frozenset({"failure", "error"})
+
+# Escapado de mensajes para una celda de tabla Markdown: sin HTML interpretado
+# (p. ej. ``<module>``), sin ``|`` que rompa columnas y sin saltos de línea
+_MD_CELL_ESCAPE = str.maketrans(
+    {"&": "&amp;", "<": "&lt;", ">": "&gt;", "|": "\\|", "\r": "", "\n": "<br>"}
+)
 
 # ---------------------------
 # Modelos
@@ -46,54 +74,86 @@ class FileCoverage:
 
 def parse_junit(junit_path: str) -> dict[str, Any]:
     """Soporta junit con raíz <testsuites> o <testsuite>."""
-    tree = ET.parse(junit_path)
-    root = tree.getroot()
-
-    suites = _get_test_suites(root)
-
-    test_stats, failed_tests = _parse_test_suites(suites)
-
-    failed = test_stats["failures"] + test_stats["errors"]
-    passed = test_stats["tests"] - failed - test_stats["skipped"]
-
-    return {
-        "tests": test_stats["tests"],
-        "passed": max(passed, 0),
-        "failed": failed,
-        "skipped": test_stats["skipped"],
-        "failures": failed_tests,
-    }
-
-
-def _get_test_suites(root: ET.Element) -> list[ET.Element]:
-    """Extrae lista de suites desde la raíz del XML."""
-    if root.tag == "testsuite":
-        return [root]
-    else:
-        return list(root.findall("testsuite"))
-
-
-def _parse_test_suites(suites: list[ET.Element]) -> tuple[dict[str, int], list[FailedTest]]:
-    """Parsea estadísticas y testcases fallidos de todas las suites."""
-    tests = failures = errors = skipped = 0
+    stats = {"tests": 0, "failures": 0, "errors": 0, "skipped": 0}
     failed_tests: list[FailedTest] = []
-
-    for suite in suites:
-        suite_stats = _parse_suite_stats(suite)
-        tests += suite_stats["tests"]
-        failures += suite_stats["failures"]
-        errors += suite_stats["errors"]
-        skipped += suite_stats["skipped"]
-
-        suite_failures = _parse_suite_testcases(suite)
-        failed_tests.extend(suite_failures)
-
+    for case in _iter_junit(junit_path, stats):
+        failed_tests.extend(_extract_test_failures(case))
+
+    return {**_summarize(**stats), "failures": failed_tests}
+
+
+def parse_junit_summary_only(junit_path: str) -> dict[str, int]:
+    """Como parse_junit pero solo con los contadores, sin mensajes de fallo.
+
+    Con raíz <testsuite> sus atributos ya son el total: se lee la etiqueta de
+    apertura y nada más. Si no, se recorre el XML como en parse_junit y los
+    testcases solo se descartan, sin examinarlos.
+    """
+    with open(junit_path, "rb") as f:
+        for _, root in ET.iterparse(f, events=("start",)):
+            if root.tag == "testsuite":
+                return _summarize(**_parse_suite_stats(root))
+            break
+
+    stats = {"tests": 0, "failures": 0, "errors": 0, "skipped": 0}
+    for _ in _iter_junit(junit_path, stats):
+        pass
+
+    return _summarize(**stats)
+
+
+def _iter_junit(junit_path: str, stats: dict[str, int]) -> Iterator[ET.Element]:
+    """Recorre junit.xml en streaming y cede los testcases de suites de primer nivel.
+
+    Solo cuentan la <testsuite> raíz o las hijas directas de la raíz: sus
+    contadores se suman en ``stats`` en su evento ``start``; los de suites
+    anidadas ya están incluidos en los de su padre. Cada testcase se cede en su
+    evento ``end`` y después se vacía y se desengancha de su padre, así la
+    memoria no crece con el tamaño del fichero (con lxml y con la stdlib).
+    """
+    parents: list[ET.Element] = []
+    # Suite de primer nivel abierta: solo se ceden los testcases bajo ella
+    top_suite = None
+
+    for event, elem in ET.iterparse(junit_path, events=("start", "end")):
+        if event == "start":
+            if elem.tag == "testsuite" and _is_top_suite(parents):
+                top_suite = elem
+                for key, value in _parse_suite_stats(elem).items():
+                    stats[key] += value
+            parents.append(elem)
+            continue
+
+        parents.pop()
+        if elem.tag == "testcase":
+            if top_suite is not None:
+                yield elem
+        elif elem.tag == "testsuite":
+            if elem is top_suite:
+                top_suite = None
+        else:
+            continue
+
+        elem.clear()
+        if parents:
+            parents[-1].remove(elem)
+
+
+def _is_top_suite(parents: list[ET.Element]) -> bool:
+    """Una <testsuite> cuenta si es la raíz o hija directa de una raíz que no es suite."""
+    return not parents or (len(parents) == 1 and parents[0].tag != "testsuite")
+
+
+def _summarize(tests: int, failures: int, errors: int, skipped: int) -> dict[str, int]:
+    """Contadores finales: failures y errors cuentan como fallidos."""
+    failed = failures + errors
+    passed = tests - failed - skipped
     return {
         "tests": tests,
-        "failures": failures,
-        "errors": errors,
+        "passed": max(passed, 0),
+        "failed": failed,
         "skipped": skipped,
-    }, failed_tests
+    }
 
 
 def _parse_suite_stats(suite: ET.Element) -> dict[str, int]:
@@ -106,26 +166,17 @@ def _parse_suite_stats(suite: ET.Element) -> dict[str, int]:
     }
 
 
-def _parse_suite_testcases(suite: ET.Element) -> list[FailedTest]:
-    """Extrae testcases fallidos de una suite."""
-    failed_tests: list[FailedTest] = []
-
-    for case in suite.iter("testcase"):
-        failures = _extract_test_failures(case)
-        failed_tests.extend(failures)
-
-    return failed_tests
-
-
 def _extract_test_failures(case: ET.Element) -> list[FailedTest]:
     """Extrae fallos de un testcase individual."""
     failures: list[FailedTest] = []
-
-    for node in list(case.findall("failure")) + list(case.findall("error")):
-        file_ = case.attrib.get("file") or ""
-        classname = case.attrib.get("classname") or ""
-        name = case.attrib.get("name") or ""
-        nodeid = f"{file_}::{name}" if file_ else f"{classname}::{name}"
+    nodeid = None
+
+    for node in case:
+        if node.tag not in _FAILURE_TAGS:
+            continue
+        if nodeid is None:
+            # Solo se construye para testcases con fallo, y una vez por testcase
+            nodeid = _testcase_nodeid(case)
         message = _extract_failure_message(node)
 
         failures.append(FailedTest(nodeid=nodeid, message=message))
@@ -133,6 +184,16 @@ def _extract_test_failures(case: ET.Element) -> list[FailedTest]:
     return failures
 
 
+def _testcase_nodeid(case: ET.Element) -> str:
+    """Identificador legible del testcase: ``fichero::nombre`` o ``clase::nombre``."""
+    attrib = case.attrib
+    name = attrib.get("name") or ""
+    file_ = attrib.get("file")
+    if file_:
+        return f"{file_}::{name}"
+    return f"{attrib.get('classname') or ''}::{name}"
+
+
 def _extract_failure_message(node: ET.Element) -> str:
     """Extrae el mensaje de error de un nodo de fallo."""
     message = (node.attrib.get("message") or "").strip()
@@ -141,22 +202,49 @@ def _extract_failure_message(node: ET.Element) -> str:
     return message
 
 
-def parse_coverage_json(cov_json_path: str) -> tuple[float, list[FileCoverage]]:
-    """Lee coverage.json de coverage.py (format v3)."""
-    with open(cov_json_path, encoding="utf-8") as f:
-        data = json.load(f)
-
-    totals = data.get("totals", {})
-    global_cov = float(totals.get("percent_covered", 0.0))
-
-    files_cov: list[FileCoverage] = []
-    for path, info in data.get("files", {}).items():
-        summary = info.get("summary", {})
-        pct = float(summary.get("percent_covered", 0.0))
-        missing = info.get("missing_lines", []) or []
-        files_cov.append(FileCoverage(path=path, percent=pct, missing_lines=missing))
-
-    return round(global_cov, 2), files_cov
+def parse_coverage_json(
+    cov_json_path: str, threshold: float, top_k: int = MAX_UNDER_FILES
+) -> tuple[float, list[FileCoverage], int]:
+    """Lee coverage.json de coverage.py (format v3).
+
+    Devuelve la cobertura global, los ``top_k`` ficheros con menor cobertura por
+    debajo de ``threshold`` (ordenados de menor a mayor) y el total de ficheros
+    bajo el umbral. El filtro y la selección se hacen durante el recorrido con
+    un heap acotado, sin lista intermedia. El JSON se lee en streaming con ijson
+    (un fichero de ``files`` cada vez y luego solo ``totals.percent_covered``),
+    así la memoria no crece con el tamaño del informe.
+    """
+    # Heap de (-pct, -orden, fichero): la raíz es el peor candidato a descartar
+    # (mayor cobertura y, a igualdad, el último visto)
+    worst: list[tuple[float, int, FileCoverage]] = []
+    under_count = 0
+    with open(cov_json_path, "rb") as f:
+        for path, info in ijson.kvitems(f, "files", use_float=True):
+            summary = info.get("summary", {})
+            pct = float(summary.get("percent_covered", 0.0))
+            if pct >= threshold:
+                continue
+            under_count += 1
+            if len(worst) >= top_k and (not worst or pct >= -worst[0][0]):
+                continue
+            missing = info.get("missing_lines", []) or []
+            file_cov = FileCoverage(path=path, percent=pct, missing_lines=missing)
+            entry = (-pct, -under_count, file_cov)
+            if len(worst) < top_k:
+                heapq.heappush(worst, entry)
+            else:
+                heapq.heapreplace(worst, entry)
+
+    under_files = [entry[2] for entry in sorted(worst, reverse=True)]
+    return _cov_total_only(cov_json_path), under_files, under_count
+
+
+def _cov_total_only(cov_json_path: str) -> float:
+    """Cobertura global de coverage.json sin construir nada por fichero."""
+    with open(cov_json_path, "rb") as f:
+        for total in ijson.items(f, "totals.percent_covered", use_float=True):
+            return round(float(total), 2)
+    return 0.0
 
 
 # ---------------------------
@@ -164,30 +252,52 @@ def parse_coverage_json(cov_json_path: str) -> tuple[float, list[FileCoverage]]:
 # ---------------------------
 
 
-def render_report(
-    junit_data: dict[str, Any],
-    coverage: float,
-    files_cov: list[FileCoverage],
-    threshold: float,
-) -> str:
-    base_dir = os.path.dirname(__file__)
-    template_dir = os.path.join(base_dir, "templates")
+@lru_cache(maxsize=8)
+def _get_env(template_dir: str) -> Environment:
+    """Crea el entorno Jinja2 de un directorio de plantillas (una vez por proceso)."""
+    from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+    cache_dir = os.environ.get("JINJA_BYTECODE_CACHE")
+    runner_temp = os.environ.get("RUNNER_TEMP")
+    if not cache_dir and runner_temp:
+        cache_dir = os.path.join(runner_temp, "jinja-bcc")
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    else:
+        bytecode_cache = FileSystemBytecodeCache()
     env = Environment(
         loader=FileSystemLoader(template_dir),
         autoescape=False,
         trim_blocks=True,
         lstrip_blocks=True,
+        bytecode_cache=bytecode_cache,
+        auto_reload=False,
+        cache_size=-1,
     )
+    env.filters["md_cell"] = _md_cell
+    return env
 
-    under_files = sorted(
-        [fc for fc in files_cov if fc.percent < threshold], key=lambda fc: fc.percent
-    )
 
-    template = env.get_template("report.md.j2")
+def _md_cell(text: str) -> str:
+    """Filtro ``md_cell``: escapa texto para una celda de tabla Markdown."""
+    return str(text).translate(_MD_CELL_ESCAPE)
+
+
+def render_report(
+    junit_data: dict[str, Any],
+    coverage: float,
+    under_files: list[FileCoverage],
+    under_count: int,
+    threshold: float,
+) -> str:
+    template_dir, name = os.path.split(TEMPLATE_PATH)
+    template = _get_env(template_dir).get_template(name)
     return template.render(
         coverage=round(coverage, 2),
         threshold=float(threshold),
         under_files=under_files,
+        under_count=under_count,
         failures=junit_data["failures"],  # lista[FailedTest]
         tests=junit_data["tests"],
         passed=junit_data["passed"],
@@ -196,37 +306,61 @@ def render_report(
     )
 
 
-def write_outputs(outputs_path: str, coverage: float, failed: int) -> None:
-    """Escribe outputs para GitHub Actions."""
+def write_outputs(outputs_path: str, coverage: float, failed: int, failing: bool) -> None:
+    """Escribe outputs para GitHub Actions (``failing`` es el veredicto de --check-exit)."""
     if not outputs_path:
         return
-    with open(outputs_path, "a", encoding="utf-8") as f:
-        f.write(f"coverage={coverage}\n")
-        f.write(f"failed={failed}\n")
+    payload = f"coverage={coverage}\nfailed={failed}\nfailing={str(failing).lower()}\n".encode()
+    with open(outputs_path, "ab") as f:
+        f.write(payload)
 
 
 def main(
-    junit_path: str, cov_json_path: str, threshold: float, output_path: str, outputs_path: str
-) -> None:
-    """Función principal: parsea, renderiza y escribe outputs."""
-    coverage, files_cov = parse_coverage_json(cov_json_path)
-    junit_data = parse_junit(junit_path)
-
-    body = render_report(junit_data, coverage, files_cov, threshold)
+    junit_path: str,
+    cov_json_path: str,
+    threshold: float,
+    output_path: str | None,
+    outputs_path: str | None,
+) -> bool:
+    """Función principal: parsea, renderiza y escribe outputs.
+
+    Cada salida es opcional: sin ``output_path`` no se renderiza el informe y sin
+    ``outputs_path`` no se escriben outputs. Devuelve True si hay tests fallidos
+    o la cobertura global < threshold, para que ``--check-exit`` reutilice este
+    mismo parseo.
+    """
+    if os.path.getsize(cov_json_path) >= PARALLEL_COVERAGE_BYTES:
+        # coverage.json grande: se parsea en otro proceso mientras se lee junit.xml
+        # (los dos parsers retienen el GIL en su bucle de eventos, con hilos no se solapan)
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            cov_future = pool.submit(parse_coverage_json, cov_json_path, threshold)
+            junit_data = parse_junit(junit_path)
+            coverage, under_files, under_count = cov_future.result()
+    else:
+        coverage, under_files, under_count = parse_coverage_json(cov_json_path, threshold)
+        junit_data = parse_junit(junit_path)
 
-    with open(output_path, "w", encoding="utf-8") as fh:
-        fh.write(body)
+    if output_path:
+        body = render_report(junit_data, coverage, under_files, under_count, threshold)
+        with open(output_path, "wb") as fh:
+            fh.write(body.encode("utf-8"))
 
-    write_outputs(outputs_path, coverage, junit_data["failed"])
+    failing = _is_failing(junit_data["failed"], coverage, threshold)
+    write_outputs(outputs_path, coverage, junit_data["failed"], failing)
+    return failing
 
 
 def check_exit(junit_path: str, cov_json_path: str, threshold: float) -> None:
-    coverage, _ = parse_coverage_json(cov_json_path)
-    junit_data = parse_junit(junit_path)
-    if junit_data["failed"] > 0 or coverage < float(threshold):
+    coverage = _cov_total_only(cov_json_path)
+    junit_data = parse_junit_summary_only(junit_path)
+    if _is_failing(junit_data["failed"], coverage, threshold):
         sys.exit(1)
 
 
+def _is_failing(failed: int, coverage: float, threshold: float) -> bool:
+    return failed > 0 or coverage < float(threshold)
+
+
 # ---------------------------
 # CLI
 # ---------------------------
@@ -242,18 +376,22 @@ def cli() -> None:
     parser.add_argument("--output", help="Output markdown file (for PR comment)")
     parser.add_argument("--outputs", help="Path to GitHub outputs file")
     parser.add_argument(
-        "--check-exit", action="store_true", help="Exit 1 if tests failed or coverage < threshold"
+        "--check-exit",
+        action="store_true",
+        help="Exit 1 if tests failed or coverage < threshold (after any requested report)",
     )
     args = parser.parse_args()
 
-    if args.check_exit:
+    if args.check_exit and not args.output and not args.outputs:
         check_exit(args.junit, args.cov, args.threshold)
         return
 
-    if not args.output or not args.outputs:
+    if not args.check_exit and not (args.output and args.outputs):
         parser.error("--output and --outputs are required unless --check-exit is set")
 
-    main(args.junit, args.cov, args.threshold, args.output, args.outputs)
+    failing = main(args.junit, args.cov, args.threshold, args.output, args.outputs)
+    if args.check_exit and failing:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
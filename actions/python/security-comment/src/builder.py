@@ -1,18 +1,23 @@
 from __future__ import annotations
 
 import argparse
-import json
+import os
 import pathlib
 import sys
 from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING
 
-from jinja2 import Environment, FileSystemLoader
+import ijson
+
+if TYPE_CHECKING:
+    from jinja2 import Environment
 
 # Severity ranking for thresholds
 SEVERITY_ORDER = {"none": 0, "low": 1, "medium": 2, "high": 3}
 
 
-@dataclass
+@dataclass(slots=True)
 class BanditIssue:
     filename: str
     line_number: int
@@ -21,6 +26,7 @@ class BanditIssue:
     test_id: str
     test_name: str
     issue_text: str
+    severity_rank: int  # SEVERITY_ORDER rank of severity, resolved at load
 
 
 # ---------------------------
@@ -29,21 +35,30 @@ class BanditIssue:
 
 
 def load_bandit(path: str) -> list[BanditIssue]:
-    """Load bandit.json and return list of BanditIssue objects."""
-    data = json.loads(pathlib.Path(path).read_text(encoding="utf-8"))
+    """Load bandit.json and return list of BanditIssue objects (severity upper-cased and ranked).
+
+    Results are streamed one at a time with ijson, so the decoded report is never
+    held in memory as a whole.
+    """
     issues: list[BanditIssue] = []
-    for i in data.get("results", []):
-        issues.append(
-            BanditIssue(
-                filename=i.get("filename", ""),
-                line_number=int(i.get("line_number", 0) or 0),
-                severity=str(i.get("issue_severity", "LOW")),
-                confidence=str(i.get("issue_confidence", "LOW")),
-                test_id=i.get("test_id", ""),
-                test_name=i.get("test_name", ""),
-                issue_text=(i.get("issue_text", "") or "").strip(),
+    with open(path, "rb") as f:
+        for i in ijson.items(f, "results.item", use_float=True):
+            get = i.get
+            severity = str(get("issue_severity", "LOW"))
+            # Positional in field order: filename, line_number, severity, confidence,
+            # test_id, test_name, issue_text, severity_rank
+            issues.append(
+                BanditIssue(
+                    get("filename", ""),
+                    int(get("line_number", 0) or 0),
+                    severity.upper(),
+                    str(get("issue_confidence", "LOW")),
+                    get("test_id", ""),
+                    get("test_name", ""),
+                    (get("issue_text", "") or "").strip(),
+                    SEVERITY_ORDER.get(severity.lower(), 0),
+                )
             )
-        )
     return issues
 
 
@@ -52,10 +67,8 @@ def filter_failures(issues: list[BanditIssue], fail_on: str) -> bool:
     threshold = SEVERITY_ORDER.get(fail_on.lower(), 0)
     if threshold == 0:
         return False
-    for i in issues:
-        if SEVERITY_ORDER.get(i.severity.lower(), 0) >= threshold:
-            return True
-    return False
+    # Ranks are resolved at load time: one int comparison per issue
+    return any(i.severity_rank >= threshold for i in issues)
 
 def build_status_message(issues: list[BanditIssue], fail_on: str) -> str:
     """Return a human-readable status message for the PR comment."""
@@ -74,16 +87,36 @@ def build_status_message(issues: list[BanditIssue], fail_on: str) -> str:
 # ---------------------------
 
 
-def render(issues: list[BanditIssue], template_path: str, output: str, status_msg: str) -> None:
-    """Render report from Jinja2 template and write markdown file."""
-    tmpl_path = pathlib.Path(template_path)
-    env = Environment(
-        loader=FileSystemLoader(str(tmpl_path.parent)),
+@lru_cache(maxsize=8)
+def _get_env(template_dir: str) -> Environment:
+    """Build the Jinja2 environment for a template directory (once per process)."""
+    from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, StrictUndefined
+
+    cache_dir = os.environ.get("JINJA_BYTECODE_CACHE")
+    runner_temp = os.environ.get("RUNNER_TEMP")
+    if not cache_dir and runner_temp:
+        cache_dir = str(pathlib.Path(runner_temp) / "jinja-bcc")
+    if cache_dir:
+        pathlib.Path(cache_dir).mkdir(parents=True, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    else:
+        bytecode_cache = FileSystemBytecodeCache()
+    return Environment(
+        loader=FileSystemLoader(template_dir),
         autoescape=False,
         trim_blocks=True,
         lstrip_blocks=True,
+        undefined=StrictUndefined,
+        bytecode_cache=bytecode_cache,
+        auto_reload=False,
+        cache_size=-1,
     )
-    template = env.get_template(tmpl_path.name)
+
+
+def render(issues: list[BanditIssue], template_path: str, output: str, status_msg: str) -> None:
+    """Render report from Jinja2 template and write markdown file."""
+    tmpl_path = pathlib.Path(template_path)
+    template = _get_env(str(tmpl_path.parent)).get_template(tmpl_path.name)
     markdown = template.render(count=len(issues), issues=issues, status_msg=status_msg)
     pathlib.Path(output).write_text(markdown, encoding="utf-8")
 
@@ -97,8 +130,9 @@ def write_outputs(outputs_path: str | None, issues: list[BanditIssue]) -> None:
     """Write GitHub Actions outputs (issue count)."""
     if not outputs_path:
         return
-    with open(outputs_path, "a", encoding="utf-8") as f:
-        f.write(f"bandit_issues={len(issues)}\n")
+    payload = f"bandit_issues={len(issues)}\n".encode()
+    with open(outputs_path, "ab") as f:
+        f.write(payload)
 
 
 # ---------------------------
@@ -3,6 +3,8 @@ import os, sys, tomllib
 from datetime import datetime
 from pathlib import Path
 import shutil
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
 from sphinx.util import logging
 
 logger = logging.getLogger(__name__)
@@ -42,17 +44,29 @@ autodoc_typehints = "description"
 add_module_names = False 
 
 
+def _replace_symlink(path: str, target: str) -> None:
+    os.remove(path)
+    shutil.copyfile(target, path)
+    logger.info(f"Replaced symlink {path} with copy")
+
+
+def _iter_links(directory: str) -> Iterator[tuple[str, str]]:
+    """Yield (path, target) for file symlinks; symlinked directories are not followed."""
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _iter_links(entry.path)
+            elif entry.is_symlink() and not entry.is_dir():
+                yield entry.path, os.readlink(entry.path)
+
+
 def on_build_finished(app, exception):
     build_static = os.path.join(app.outdir, "_static")
     if os.path.exists(build_static):
-        for root, dirs, files in os.walk(build_static):
-            for name in files:
-                path = os.path.join(root, name)
-                if os.path.islink(path):
-                    target = os.readlink(path)
-                    os.remove(path)
-                    shutil.copy(target, path)
-                    logger.info(f"Replaced symlink {path} with copy")
+        links = list(_iter_links(build_static))
+        # Copies are I/O bound: overlap them instead of copying one by one
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda link: _replace_symlink(*link), links))
 
 def setup(app):
     app.connect("build-finished", on_build_finished)